@@ -2,6 +2,10 @@ import type { NextConfig } from "next";
 
 const nextConfig: NextConfig = {
   serverExternalPackages: ['groq-sdk'],
+  // Gzip responses from 'next start'. This is Next's default, but it is
+  // load-bearing for the API (health probes, transcription JSON), so keep
+  // it explicit. HTTP/2 termination is left to the fronting proxy/CDN.
+  compress: true,
   images: {
     remotePatterns: [
       {
@@ -10,15 +10,31 @@ interface HealthResponse {
   auth_configured: boolean
 }
 
-export async function GET(): Promise<NextResponse<HealthResponse>> {
-  const dbHealthy = await checkDatabaseHealth()
-  
-  return NextResponse.json({
+// Environment configuration is fixed for the lifetime of the process, so
+// resolve it once at module load instead of on every load-balancer probe.
+const GROQ_CONFIGURED = Boolean(process.env.GROQ_API_KEY)
+const AUTH_CONFIGURED = Boolean(process.env.GOOGLE_CLIENT_ID_WEB && process.env.NEXTAUTH_SECRET)
+
+function healthBody(dbHealthy: boolean): HealthResponse {
+  return {
     status: dbHealthy ? "healthy" : "degraded",
     service: "PolyVoice API",
     version: "1.0.0",
-    groq_configured: Boolean(process.env.GROQ_API_KEY),
+    groq_configured: GROQ_CONFIGURED,
     database_connected: dbHealthy,
-    auth_configured: Boolean(process.env.GOOGLE_CLIENT_ID_WEB && process.env.NEXTAUTH_SECRET)
+    auth_configured: AUTH_CONFIGURED
+  }
+}
+
+// Only database_connected varies between probes, so both possible bodies
+// are serialized once at module load and the handler just picks one.
+const HEALTHY_BODY = JSON.stringify(healthBody(true))
+const DEGRADED_BODY = JSON.stringify(healthBody(false))
+
+export async function GET(): Promise<NextResponse> {
+  const dbHealthy = await checkDatabaseHealth()
+
+  return new NextResponse(dbHealthy ? HEALTHY_BODY : DEGRADED_BODY, {
+    headers: { 'Content-Type': 'application/json' }
   })
 }
\ No newline at end of file
@@ -1,22 +1,95 @@
 import { NextRequest, NextResponse } from 'next/server'
-import { promises as fs } from 'fs'
-import { tmpdir } from 'os'
-import { join } from 'path'
-import { randomUUID } from 'crypto'
+import { createHash } from 'crypto'
+import { extname } from 'path'
 import 'groq-sdk/shims/web'
 import Groq from 'groq-sdk'
-import { authenticateRequest, AuthenticationError, RateLimitError, createErrorResponse, getRateLimitStatus } from '@/lib/auth-middleware'
-
-const groq = new Groq({
-  apiKey: process.env.GROQ_API_KEY
-})
+import { authenticateRequest, AuthenticatedRequest, AuthenticationError, RateLimitError, createErrorResponse, getRateLimitStatus } from '@/lib/auth-middleware'
+import { logger } from '@/lib/logger'
 
 // Validate API key
 if (!process.env.GROQ_API_KEY) {
-  console.error('❌ GROQ_API_KEY is not set in environment variables')
+  logger.error('❌ GROQ_API_KEY is not set in environment variables')
+}
+
+// Reuse a single Groq client so every request shares one connection pool.
+// In development a global preserves the instance across module reloads
+// caused by HMR (Hot Module Replacement), same as the MongoDB client.
+const globalWithGroq = global as typeof globalThis & {
+  _groqClient?: Groq
+}
+
+const groq = globalWithGroq._groqClient ?? new Groq({
+  apiKey: process.env.GROQ_API_KEY,
+  timeout: 120 * 1000, // Large uploads on slow links can take a while
+  maxRetries: 2
+})
+
+if (process.env.NODE_ENV === 'development') {
+  globalWithGroq._groqClient = groq
+}
+
+// Warm up the connection to the Groq API at module load so the first
+// transcription doesn't pay for the TCP+TLS handshake. Best-effort only;
+// real requests will surface any errors.
+if (process.env.GROQ_API_KEY) {
+  groq.models.list().catch(() => {})
 }
 
 const SUPPORTED_FORMATS = new Set(['.m4a', '.mp3', '.wav', '.ogg', '.webm'])
+const SUPPORTED_FORMATS_LIST = Array.from(SUPPORTED_FORMATS).join(', ')
+
+const TRANSCRIPTION_MODEL = 'distil-whisper-large-v3-en'
+
+const BYTES_PER_MB = 1024 * 1024
+const MB_PER_MINUTE = 0.5 // Rough M4A size-to-duration ratio for estimates
+const COST_PER_MINUTE = 0.003 // USD per transcribed minute estimate
+
+// Uploads above this size are rejected before the multipart body is parsed.
+// Defaults to 25MB, the upstream Whisper file limit.
+const MAX_AUDIO_BYTES = Number(process.env.MAX_AUDIO_BYTES) || 25 * BYTES_PER_MB
+const MAX_AUDIO_MB = Math.floor(MAX_AUDIO_BYTES / BYTES_PER_MB)
+
+// Transcription cache (in-memory)
+// Duplicate uploads (client retries, repeated submissions) are served from
+// cache instead of re-running a billable Groq transcription.
+interface CachedTranscription {
+  text: string
+  expiresAt: number
+}
+
+const transcriptionCache = new Map<string, CachedTranscription>()
+
+const TRANSCRIPTION_CACHE_MAX_ENTRIES = 1024
+const TRANSCRIPTION_CACHE_TTL_MS = 60 * 60 * 1000 // 1 hour
+
+function getCachedTranscription(digest: string): string | null {
+  const cached = transcriptionCache.get(digest)
+  if (!cached) {
+    return null
+  }
+
+  if (Date.now() > cached.expiresAt) {
+    transcriptionCache.delete(digest)
+    return null
+  }
+
+  return cached.text
+}
+
+function cacheTranscription(digest: string, text: string): void {
+  // Evict the oldest entry once full (Map preserves insertion order)
+  if (transcriptionCache.size >= TRANSCRIPTION_CACHE_MAX_ENTRIES) {
+    const oldestDigest = transcriptionCache.keys().next().value
+    if (oldestDigest !== undefined) {
+      transcriptionCache.delete(oldestDigest)
+    }
+  }
+
+  transcriptionCache.set(digest, {
+    text,
+    expiresAt: Date.now() + TRANSCRIPTION_CACHE_TTL_MS
+  })
+}
 
 interface TranscriptionResponse {
   text: string
@@ -24,6 +97,7 @@ interface TranscriptionResponse {
   processing_time_ms: number
   estimated_cost: number
   estimated_minutes: number
+  cache_hit: boolean
   user_id: string
   rate_limit: {
     remaining: number
@@ -42,149 +116,152 @@ interface ErrorResponse {
   retryAfter?: number
 }
 
-export async function POST(request: NextRequest): Promise<NextResponse<TranscriptionResponse | ErrorResponse>> {
-  console.log("=== V1 TRANSCRIBE ENDPOINT CALLED ===")
+function errorResponse(status: number, code: string, message: string, type: string): NextResponse<ErrorResponse> {
+  return NextResponse.json(
+    {
+      error: { code, message, type },
+      timestamp: new Date().toISOString()
+    },
+    { status }
+  )
+}
+
+// The happy path lives in its own function so the endpoint boundary below
+// stays a thin auth + error-mapping wrapper.
+async function handleTranscription(request: NextRequest, authData: AuthenticatedRequest): Promise<NextResponse<TranscriptionResponse | ErrorResponse>> {
+  // Get current rate limit status
+  const rateLimitStatus = getRateLimitStatus(authData.userId)
+  logger.debug('📊 Rate limit - Remaining: %d/%d', rateLimitStatus.remaining, rateLimitStatus.limit)
   
+  // Reject oversized uploads from the Content-Length header alone, before
+  // the multipart body is materialized in memory
+  const contentLength = Number(request.headers.get('content-length'))
+  if (contentLength > MAX_AUDIO_BYTES) {
+    return errorResponse(413, 'FILE_TOO_LARGE', `Audio file exceeds the ${MAX_AUDIO_MB}MB limit`, 'ValidationError')
+  }
+
+  const formData = await request.formData()
+  const audio = formData.get('audio') as File
+
+  if (!audio) {
+    return errorResponse(400, 'NO_AUDIO_FILE', 'No audio file provided', 'ValidationError')
+  }
+  
+  logger.debug('📁 Processing file: %s', audio.name)
+  logger.debug('📋 Content type: %s', audio.type)
+  
+  // Validate file format. A missing or extension-less filename falls back
+  // to .m4a, the format the PolyVoice app records in.
+  const fileExtension = (audio.name ? extname(audio.name).toLowerCase() : '') || '.m4a'
+  if (!SUPPORTED_FORMATS.has(fileExtension)) {
+    return errorResponse(400, 'UNSUPPORTED_FORMAT', `Unsupported audio format. Supported formats: ${SUPPORTED_FORMATS_LIST}`, 'ValidationError')
+  }
+
+  logger.debug('🎵 Using file extension: %s', fileExtension)
+  
+  if (audio.size === 0) {
+    return errorResponse(400, 'EMPTY_AUDIO_FILE', 'Empty audio file', 'ValidationError')
+  }
+
+  // Re-check the real file size - Content-Length is client-supplied and
+  // absent on chunked requests
+  if (audio.size > MAX_AUDIO_BYTES) {
+    return errorResponse(413, 'FILE_TOO_LARGE', `Audio file exceeds the ${MAX_AUDIO_MB}MB limit`, 'ValidationError')
+  }
+
+  // Calculate estimates
+  const fileSizeMB = audio.size / BYTES_PER_MB
+  const estimatedMinutes = Math.max(fileSizeMB / MB_PER_MINUTE, 0.1) // Rough estimate, minimum 0.1 minutes
+  logger.debug('📊 File size: %fMB, Estimated duration: %f minutes', fileSizeMB, estimatedMinutes)
+
+  // Hash the audio so identical uploads can short-circuit to the cache.
+  // formData() has already buffered the file in memory, so arrayBuffer()
+  // is just a view, not a second read.
+  const audioDigest = createHash('blake2b512')
+    .update(new Uint8Array(await audio.arrayBuffer()))
+    .digest('hex')
+
+  const cachedText = getCachedTranscription(audioDigest)
+  if (cachedText !== null) {
+    logger.debug('♻️ Cache hit - skipping Groq transcription')
+
+    const rateLimitStatusNow = getRateLimitStatus(authData.userId)
+    return NextResponse.json({
+      text: cachedText,
+      model_used: TRANSCRIPTION_MODEL,
+      processing_time_ms: 0,
+      estimated_cost: 0,
+      estimated_minutes: Math.round(estimatedMinutes * 100) / 100,
+      cache_hit: true,
+      user_id: authData.userId,
+      rate_limit: {
+        remaining: rateLimitStatusNow.remaining,
+        reset_time: rateLimitStatusNow.resetTime,
+        limit: rateLimitStatusNow.limit
+      }
+    })
+  }
+
+  // Start transcription - stream the uploaded file directly to Groq.
+  // performance.now() is monotonic, so the measurement can't go negative
+  // under NTP clock adjustments the way Date.now() deltas can.
+  const startTime = performance.now()
+  logger.debug('🎯 Starting Groq transcription with %s...', TRANSCRIPTION_MODEL)
+
+  const transcription = await groq.audio.transcriptions.create({
+    file: audio,
+    model: TRANSCRIPTION_MODEL,
+    response_format: "verbose_json",
+    prompt: "You are a helpful assistant that transcribes audio in to text. You always return the text with punctuation and capitalization wherever it is appropriate."
+  })
+
+  // Calculate processing metrics
+  const processingTimeMs = Math.round(performance.now() - startTime)
+  const estimatedCost = estimatedMinutes * COST_PER_MINUTE
+
+  logger.debug("✅ Transcription completed: '%s'", transcription.text)
+  logger.debug('⏱️  Processing time: %dms', processingTimeMs)
+
+  cacheTranscription(audioDigest, transcription.text)
+
+  // Get updated rate limit status after processing
+  const updatedRateLimitStatus = getRateLimitStatus(authData.userId)
+
+  const result: TranscriptionResponse = {
+    text: transcription.text,
+    model_used: TRANSCRIPTION_MODEL,
+    processing_time_ms: processingTimeMs,
+    estimated_cost: Math.round(estimatedCost * 1000000) / 1000000, // Round to 6 decimal places
+    estimated_minutes: Math.round(estimatedMinutes * 100) / 100, // Round to 2 decimal places
+    cache_hit: false,
+    user_id: authData.userId,
+    rate_limit: {
+      remaining: updatedRateLimitStatus.remaining,
+      reset_time: updatedRateLimitStatus.resetTime,
+      limit: updatedRateLimitStatus.limit
+    }
+  }
+
+  logger.debug('📤 Returning result: %s...', result.text.substring(0, 50))
+  return NextResponse.json(result)
+}
+
+export async function POST(request: NextRequest): Promise<NextResponse<TranscriptionResponse | ErrorResponse>> {
+  logger.debug('=== V1 TRANSCRIBE ENDPOINT CALLED ===')
+
   try {
     // 🔐 AUTHENTICATION REQUIRED - All requests must be authenticated
-    console.log("🔐 Validating authentication...")
+    logger.debug('🔐 Validating authentication...')
     const authData = await authenticateRequest(request)
-    console.log(`✅ Authenticated user: ${authData.email} (${authData.userId})`)
-    
-    // Get current rate limit status
-    const rateLimitStatus = getRateLimitStatus(authData.userId)
-    console.log(`📊 Rate limit - Remaining: ${rateLimitStatus.remaining}/${rateLimitStatus.limit}`)
-    
-    const formData = await request.formData()
-    const audio = formData.get('audio') as File
-    
-    if (!audio) {
-      return NextResponse.json(
-        { 
-          error: {
-            code: 'NO_AUDIO_FILE',
-            message: 'No audio file provided',
-            type: 'ValidationError'
-          },
-          timestamp: new Date().toISOString()
-        },
-        { status: 400 }
-      )
-    }
-    
-    console.log(`📁 Processing file: ${audio.name}`)
-    console.log(`📋 Content type: ${audio.type}`)
-    
-    // Validate file format
-    let fileExtension: string
-    if (audio.name) {
-      fileExtension = '.' + audio.name.split('.').pop()?.toLowerCase()
-      if (!SUPPORTED_FORMATS.has(fileExtension)) {
-        return NextResponse.json(
-          { 
-            error: {
-              code: 'UNSUPPORTED_FORMAT',
-              message: `Unsupported audio format. Supported formats: ${Array.from(SUPPORTED_FORMATS).join(', ')}`,
-              type: 'ValidationError'
-            },
-            timestamp: new Date().toISOString()
-          },
-          { status: 400 }
-        )
-      }
-    } else {
-      fileExtension = '.m4a' // Default for PolyVoice app
-    }
-    
-    console.log(`🎵 Using file extension: ${fileExtension}`)
-    
-    // Read audio data
-    const audioBuffer = await audio.arrayBuffer()
-    const audioData = new Uint8Array(audioBuffer)
-    
-    if (audioData.length === 0) {
-      return NextResponse.json(
-        { 
-          error: {
-            code: 'EMPTY_AUDIO_FILE',
-            message: 'Empty audio file',
-            type: 'ValidationError'
-          },
-          timestamp: new Date().toISOString()
-        },
-        { status: 400 }
-      )
-    }
-    
-    // Create temporary file
-    const tempFileName = `polyvoice-${randomUUID()}${fileExtension}`
-    const tempFilePath = join(tmpdir(), tempFileName)
-    
-    await fs.writeFile(tempFilePath, audioData)
-    console.log(`💾 Saved to temporary file: ${tempFilePath}`)
-    
-    try {
-      // Calculate estimates
-      const fileSizeMB = audioData.length / (1024 * 1024)
-      const estimatedMinutes = Math.max(fileSizeMB / 0.5, 0.1) // Rough estimate, minimum 0.1 minutes
-      console.log(`📊 File size: ${fileSizeMB.toFixed(2)}MB, Estimated duration: ${estimatedMinutes.toFixed(2)} minutes`)
-      
-      // Start transcription
-      const startTime = Date.now()
-      console.log("🎯 Starting Groq transcription with distil-whisper-large-v3-en...")
-      
-      const audioFile = await fs.readFile(tempFilePath)
-      const transcription = await groq.audio.transcriptions.create({
-        file: new File([audioFile], audio.name, { type: audio.type }),
-        model: "distil-whisper-large-v3-en",
-        response_format: "verbose_json",
-        prompt: "You are a helpful assistant that transcribes audio in to text. You always return the text with punctuation and capitalization wherever it is appropriate."
-      })
-      
-      // Calculate processing metrics
-      const endTime = Date.now()
-      const processingTimeMs = endTime - startTime
-      const estimatedCost = estimatedMinutes * 0.003 // $0.003 per minute estimate
-      
-      console.log(`✅ Transcription completed: '${transcription.text}'`)
-      console.log(`⏱️  Processing time: ${processingTimeMs}ms`)
-      
-      // Get updated rate limit status after processing
-      const updatedRateLimitStatus = getRateLimitStatus(authData.userId)
-      
-      const result: TranscriptionResponse = {
-        text: transcription.text,
-        model_used: "distil-whisper-large-v3-en",
-        processing_time_ms: processingTimeMs,
-        estimated_cost: Math.round(estimatedCost * 1000000) / 1000000, // Round to 6 decimal places
-        estimated_minutes: Math.round(estimatedMinutes * 100) / 100, // Round to 2 decimal places
-        user_id: authData.userId,
-        rate_limit: {
-          remaining: updatedRateLimitStatus.remaining,
-          reset_time: updatedRateLimitStatus.resetTime,
-          limit: updatedRateLimitStatus.limit
-        }
-      }
-      
-      console.log(`📤 Returning result: ${result.text.substring(0, 50)}...`)
-      return NextResponse.json(result)
-      
-    } finally {
-      // Clean up temporary file
-      try {
-        await fs.unlink(tempFilePath)
-        console.log("🗑️ Temporary file cleaned up")
-      } catch (error) {
-        console.warn(`Failed to clean up temporary file: ${error}`)
-      }
-    }
-    
+    logger.debug('✅ Authenticated user: %s (%s)', authData.email, authData.userId)
+
+    return await handleTranscription(request, authData)
   } catch (error: unknown) {
-    console.log(`❌ Transcription error: ${error}`)
+    logger.error('❌ Transcription error:', error)
     
     // Handle authentication and rate limiting errors
     if (error instanceof AuthenticationError || error instanceof RateLimitError) {
-      console.log(`🚫 ${error.name}: ${error.message}`)
+      logger.warn('🚫 %s: %s', error.name, error.message)
       return NextResponse.json(
         createErrorResponse(error),
         { 
@@ -197,16 +274,6 @@ export async function POST(request: NextRequest): Promise<NextResponse<Transcrip
     }
     
     // Handle other errors
-    return NextResponse.json(
-      {
-        error: {
-          code: 'TRANSCRIPTION_FAILED',
-          message: 'Transcription processing failed',
-          type: 'TranscriptionError'
-        },
-        timestamp: new Date().toISOString()
-      },
-      { status: 500 }
-    )
+    return errorResponse(500, 'TRANSCRIPTION_FAILED', 'Transcription processing failed', 'TranscriptionError')
   }
 }
\ No newline at end of file
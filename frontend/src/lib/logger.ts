@@ -0,0 +1,29 @@
+// Lightweight leveled logger for API routes.
+// The level comes from LOG_LEVEL (debug | info | warn | error) and defaults
+// to 'debug' in development, 'info' in production.
+
+const LOG_LEVELS = ['debug', 'info', 'warn', 'error'] as const
+
+export type LogLevel = (typeof LOG_LEVELS)[number]
+
+function resolveLevel(): LogLevel {
+  const configured = process.env.LOG_LEVEL?.toLowerCase() as LogLevel | undefined
+  if (configured && LOG_LEVELS.includes(configured)) {
+    return configured
+  }
+  return process.env.NODE_ENV === 'development' ? 'debug' : 'info'
+}
+
+const threshold = LOG_LEVELS.indexOf(resolveLevel())
+
+const noop = () => {}
+
+// Disabled levels resolve to a no-op up front, so per-call cost is zero.
+// Callers should use printf-style messages ('%s', '%d') rather than template
+// literals so arguments aren't stringified when the level is disabled.
+export const logger = {
+  debug: threshold <= 0 ? console.debug.bind(console) : noop,
+  info: threshold <= 1 ? console.info.bind(console) : noop,
+  warn: threshold <= 2 ? console.warn.bind(console) : noop,
+  error: console.error.bind(console)
+}